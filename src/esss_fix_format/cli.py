@@ -1,5 +1,6 @@
 #!python
 import codecs
+import functools
 import io
 import os
 import re
@@ -8,48 +9,148 @@ import subprocess
 import sys
 from pathlib import Path
 from typing import Dict
+from typing import FrozenSet
 from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Optional
 from typing import Sequence
 from typing import Set
 from typing import Tuple
+from typing import TYPE_CHECKING
+from typing import Union
+
+if TYPE_CHECKING:
+    import isort
 
-import boltons.iterutils
 import click
-from isort.exceptions import FileSkipComment
-
-CPP_PATTERNS = {
-    "*.cpp",
-    "*.c",
-    "*.h",
-    "*.hpp",
-    "*.hxx",
-    "*.cxx",
-    "*.cu",
-}
 
-PATTERNS = {
-    "*.py",
-    "*.java",
-    "*.js",
-    "*.pyx",
-    "*.pxd",
-    "CMakeLists.txt",
-    "*.cmake",
-}.union(CPP_PATTERNS)
-
-SKIP_DIRS = {
-    ".git",
-    ".hg",
-}
+CPP_PATTERNS = frozenset(
+    {
+        "*.cpp",
+        "*.c",
+        "*.h",
+        "*.hpp",
+        "*.hxx",
+        "*.cxx",
+        "*.cu",
+    }
+)
+
+PATTERNS = (
+    frozenset(
+        {
+            "*.py",
+            "*.java",
+            "*.js",
+            "*.pyx",
+            "*.pxd",
+            "CMakeLists.txt",
+            "*.cmake",
+        }
+    )
+    | CPP_PATTERNS
+)
+
+SKIP_DIRS = frozenset(
+    {
+        ".git",
+        ".hg",
+    }
+)
+
+_WILDCARD_CHARS = ("*", "?", "[")
+
+# The printable ASCII range (' ' to '~', codes 32-126) plus whitespace control
+# characters; content with any byte outside this set requires a UTF-8 BOM.
+_PRINTABLE_ASCII_BYTES = bytes(list(range(32, 127)) + [9, 10, 11, 12, 13])
+
+_VALIDATION_CHUNK_SIZE = 64 * 1024
 
+# How many buffered per-file status lines to emit per terminal write.
+_REPORT_FLUSH_EVERY = 512
 
+# Filenames are formatted for display up to twice each (status line plus error
+# messages); memoizing keeps the repeat calls to a cache hit.
+_format_filename = functools.lru_cache(maxsize=4096)(click.format_filename)
+
+# Matches any import statement; files without one have nothing for isort to do.
+_IMPORT_RE = re.compile(r"^\s*(?:import|from)\s", re.MULTILINE)
+
+
+@functools.lru_cache(maxsize=None)
+def _split_patterns(
+    patterns: FrozenSet[str],
+) -> Tuple[FrozenSet[str], FrozenSet[str], Tuple[str, ...]]:
+    """
+    Split glob patterns into sets suitable for plain lookups, avoiding fnmatch on the hot path.
+
+    Returns a tuple (extensions, literals, remaining) where `extensions` contains the lowercase
+    extensions of patterns in the common "*.ext" form, `literals` contains lowercase patterns
+    without any wildcard (plain file names) and `remaining` contains whatever patterns still
+    need full fnmatch treatment.
+    """
+    extensions = set()
+    literals = set()
+    remaining = []
+    for pattern in patterns:
+        if pattern.startswith("*.") and not any(c in pattern[1:] for c in _WILDCARD_CHARS):
+            extensions.add(pattern[1:].lower())
+        elif not any(c in pattern for c in _WILDCARD_CHARS):
+            literals.add(pattern.lower())
+        else:
+            remaining.append(pattern)
+    return frozenset(extensions), frozenset(literals), tuple(remaining)
+
+
+_CPP_EXTS = _split_patterns(frozenset(CPP_PATTERNS))[0]
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_fnmatch_patterns(patterns: Tuple[str, ...]) -> Optional["re.Pattern[str]"]:
+    """
+    Compile glob patterns into one alternation regex (None when there are no patterns),
+    so matching a name against the whole set is a single C-level regex match instead of
+    one fnmatch (with its own translate/compile round) per pattern.
+    """
+    from fnmatch import translate
+
+    if not patterns:
+        return None
+    return re.compile("|".join(translate(os.path.normcase(p)) for p in patterns))
+
+
+@functools.lru_cache(maxsize=4096)
+def _listdir_set(directory: str) -> FrozenSet[str]:
+    """Return the set of names in `directory`, or an empty set if it cannot be listed."""
+    try:
+        return frozenset(os.listdir(directory))
+    except OSError:
+        return frozenset()
+
+
+def _walk_files(directory: str) -> Iterator[str]:
+    """
+    Recursively yield all files below `directory` using os.scandir, pruning SKIP_DIRS.
+
+    Using the DirEntry type information avoids one stat() call per entry compared
+    to classifying names returned by os.walk.
+    """
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in SKIP_DIRS:
+                    yield from _walk_files(entry.path)
+            elif not entry.is_dir():
+                # entry is a regular file or symlink to one; symlinks to directories
+                # are skipped, mirroring what os.walk(followlinks=False) did.
+                yield entry.path
+
+
+@functools.lru_cache(maxsize=4096)
 def is_cpp(filename: Path) -> bool:
     """Return True if the filename is of a type that should be treated as C++ source."""
-    from fnmatch import fnmatch
-
-    return any(fnmatch(os.path.basename(filename), p) for p in CPP_PATTERNS)
+    return os.path.splitext(filename)[1].lower() in _CPP_EXTS
 
 
 def should_format(
@@ -67,15 +168,22 @@ def should_format(
 
     :return: a tuple (should_format, reason).
     """
-    from fnmatch import fnmatch
-
-    if any(fnmatch(os.path.abspath(filename), pattern) for pattern in exclude_patterns):
+    exclude_re = _compile_fnmatch_patterns(tuple(exclude_patterns))
+    if exclude_re is not None and exclude_re.match(os.path.normcase(os.path.abspath(filename))):
         return False, "Excluded file"
 
     filename_no_ext, ext = os.path.splitext(filename)
     # ignore .py file that has a jupytext configured notebook with the same base name
     ipynb_filename = filename_no_ext + ".ipynb"
-    if ext == ".py" and os.path.isfile(ipynb_filename):
+    # The cached listing is only a cheap name pre-filter; on a hit, confirm the
+    # sibling is a regular file (not a directory or broken symlink) before reading
+    # it, paying the stat only in the rare sibling-exists case.
+    if (
+        ext == ".py"
+        and os.path.basename(ipynb_filename)
+        in _listdir_set(os.path.abspath(os.path.dirname(filename)))
+        and os.path.isfile(ipynb_filename)
+    ):
         with open(ipynb_filename, "rb") as f:
             if b"jupytext" not in f.read():
                 return True, ""
@@ -84,7 +192,12 @@ def should_format(
                 return True, ""
         return False, "Jupytext generated file"
 
-    if any(fnmatch(os.path.basename(filename), pattern) for pattern in include_patterns):
+    extensions, literals, remaining = _split_patterns(frozenset(include_patterns))
+    basename = os.path.basename(filename)
+    if ext.lower() in extensions or basename.lower() in literals:
+        return True, ""
+    remaining_re = _compile_fnmatch_patterns(remaining)
+    if remaining_re is not None and remaining_re.match(os.path.normcase(basename)):
         return True, ""
 
     return False, "Unknown file type"
@@ -97,21 +210,33 @@ def find_pyproject_toml(files_or_directories: Sequence[Path]) -> Optional[Path]:
     We find the common ancestor of all files/directories given, then search from there
     upwards for a "pyproject.toml" file with a "[tool.black]" section.
     """
+    import itertools
+
     if not files_or_directories:
         files_or_directories = [Path.cwd()]
     common = Path(os.path.commonpath(files_or_directories)).absolute()
-    for p in [common] + list(common.parents):
+    for p in itertools.chain((common,), common.parents):
         fn = p / "pyproject.toml"
         if fn.is_file():
             return fn
     return None
 
 
+@functools.lru_cache(maxsize=32)
+def _read_pyproject_text(pyproject_toml: Path, mtime_ns: int, size: int) -> str:
+    """
+    Read pyproject.toml, cached by stat fingerprint so the file is read once per run
+    even though both the black check and the exclude patterns need it, while an edit
+    to the file (new mtime/size) still invalidates the entry.
+    """
+    return pyproject_toml.read_text(encoding="UTF-8")
+
+
 def read_exclude_patterns(pyproject_toml: Path) -> Sequence[str]:
     import tomli
 
-    with pyproject_toml.open("rb") as f:
-        toml_contents = tomli.load(f)
+    st = os.stat(pyproject_toml)
+    toml_contents = tomli.loads(_read_pyproject_text(pyproject_toml, st.st_mtime_ns, st.st_size))
     ff_options = toml_contents.get("tool", {}).get("esss_fix_format", {})
     excludes_option = ff_options.get("exclude", [])
     if not isinstance(excludes_option, list):
@@ -126,45 +251,71 @@ def read_exclude_patterns(pyproject_toml: Path) -> Sequence[str]:
     return excludes_option
 
 
+def _file_cache_path() -> Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return Path(cache_home, "esss_fix_format", "cache.json")
+
+
+def _load_file_cache(cache_file: Path) -> Dict[str, List[int]]:
+    """Load the path -> [mtime_ns, size] map of files known clean from previous runs."""
+    import json
+
+    try:
+        with cache_file.open("r", encoding="UTF-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_file_cache(cache_file: Path, data: Dict[str, List[int]]) -> None:
+    """Write the clean-files cache atomically (best effort: failures are ignored)."""
+    import json
+
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(".tmp")
+        with tmp_file.open("w", encoding="UTF-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        pass
+
+
 def has_black_config(pyproject_toml: Optional[Path]) -> bool:
-    if pyproject_toml is None:
+    if pyproject_toml is None or not pyproject_toml.is_file():
         return False
-    return pyproject_toml.is_file() and "[tool.black]" in pyproject_toml.read_text(encoding="UTF-8")
+    st = os.stat(pyproject_toml)
+    return "[tool.black]" in _read_pyproject_text(pyproject_toml, st.st_mtime_ns, st.st_size)
 
 
-# caches which directories have the `.clang-format` file, *in or above it*, to avoid hitting the
-# disk too many times
-__HAS_DOT_CLANG_FORMAT: Dict[str, bool] = dict()
+@functools.lru_cache(maxsize=256)
+def _isort_config(settings_path: str) -> "isort.Config":
+    """
+    Return the isort configuration that applies to `settings_path`, cached per directory.
 
+    Building a Config walks upwards looking for `.isort.cfg`/`setup.cfg` and parses them,
+    so without the cache a thousand files in one directory would parse the same files a
+    thousand times.
+    """
+    import isort
 
-def should_use_clang_format(filename: Path) -> bool:
-    filename = filename.absolute()
-    path_components = str(filename).split(os.sep)[:-1]
-    paths_to_try = tuple(
-        os.sep.join(path_components[:i] + [".clang-format"])
-        for i in range(1, len(path_components) + 1)
-    )
+    return isort.Config(settings_path=settings_path)
 
-    # From file directory, going upwards, find the first directory already cached
-    has_it = False
-    for i in range(len(paths_to_try) - 1, -1, -1):
-        path = paths_to_try[i]
-        if path in __HAS_DOT_CLANG_FORMAT:
-            has_it = __HAS_DOT_CLANG_FORMAT[path]
-            break
 
-    if has_it:
+@functools.lru_cache(maxsize=4096)
+def _dir_has_clang_format(directory: str) -> bool:
+    """Return True if `directory` or any of its ancestors contains a `.clang-format` file."""
+    if os.path.isfile(os.path.join(directory, ".clang-format")):
         return True
+    parent = os.path.dirname(directory)
+    if parent == directory:
+        return False
+    return _dir_has_clang_format(parent)
 
-    # Go downwards again, looking in the disk and filling the cache if found
-    found = False
-    for path in paths_to_try[i + 1 :]:
-        if found:
-            __HAS_DOT_CLANG_FORMAT[path] = True
-            continue
-        found = __HAS_DOT_CLANG_FORMAT[path] = os.path.isfile(path)
 
-    return found
+def should_use_clang_format(filename: Path) -> bool:
+    return _dir_has_clang_format(os.path.dirname(str(filename.absolute())))
 
 
 @click.command()
@@ -178,6 +329,12 @@ def should_use_clang_format(filename: Path) -> bool:
     "--stdin", default=False, is_flag=True, help="Read filenames from stdin (1 per line)."
 )
 @click.option("-c", "--commit", default=False, is_flag=True, help="Use modified files from git.")
+@click.option(
+    "--git-staged",
+    default=False,
+    is_flag=True,
+    help="Use files staged for commit in git (used by the pre-commit hook).",
+)
 @click.option(
     "--git-hooks",
     default=False,
@@ -187,13 +344,29 @@ def should_use_clang_format(filename: Path) -> bool:
 @click.option(
     "-v", "--verbose", default=False, is_flag=True, help="Show skipped files in the output"
 )
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    help="Number of worker processes used to format files (0 means one per CPU).",
+)
+@click.option(
+    "--cache/--no-cache",
+    "use_cache",
+    default=False,
+    help="Skip files unchanged since the last clean run"
+    " (cache kept in ~/.cache/esss_fix_format).",
+)
 def main(
     files_or_directories: Sequence[Path],
     check: bool,
     stdin: bool,
     commit: bool,
+    git_staged: bool,
     git_hooks: bool,
     verbose: bool,
+    jobs: int,
+    use_cache: bool,
 ) -> None:
     """Fixes and checks formatting according to ESSS standards."""
 
@@ -203,7 +376,105 @@ def main(
         install_pre_commit_hook()  # uses the current directory by default.
         return
 
-    sys.exit(_main(files_or_directories, check=check, stdin=stdin, commit=commit, verbose=verbose))
+    sys.exit(
+        _main(
+            files_or_directories,
+            check=check,
+            stdin=stdin,
+            commit=commit,
+            git_staged=git_staged,
+            verbose=verbose,
+            jobs=jobs,
+            use_cache=use_cache,
+        )
+    )
+
+
+def _validate_cpp_contents(filename: Path) -> Optional[str]:
+    """
+    Check that a C++ file is UTF-8 decodable and carries a BOM when it holds non-ASCII
+    content, returning an error message (or None when the file is fine).
+    """
+    decoder = codecs.getincrementaldecoder("UTF-8")()
+    has_bom = False
+    needs_bom = False
+    with io.open(filename, "rb") as f:
+        first_chunk = True
+        while True:
+            chunk = f.read(_VALIDATION_CHUNK_SIZE)
+            try:
+                decoder.decode(chunk, final=not chunk)
+            except UnicodeDecodeError:
+                msg = ": ERROR The file contents can not be decoded using UTF-8"
+                return _format_filename(filename) + msg
+            if first_chunk:
+                has_bom = chunk.startswith(codecs.BOM_UTF8)
+                first_chunk = False
+            # Drop every printable ASCII and whitespace byte in a single C-level pass;
+            # anything left over means the content needs an explicit UTF-8 BOM.
+            if not needs_bom and chunk.translate(None, _PRINTABLE_ASCII_BYTES):
+                needs_bom = True
+            if not chunk:
+                break
+    if needs_bom and not has_bom:
+        msg = (
+            ": ERROR Not a valid UTF-8 encoded file, since it contains"
+            " non-ASCII characters. Ensure it has UTF-8 encoding with BOM."
+        )
+        return _format_filename(filename) + msg
+    return None
+
+
+def run_clang_format_on_files(
+    files: Sequence[Path], *, check: bool
+) -> Dict[Path, Tuple[bool, Sequence[str], Optional[str]]]:
+    """
+    Run clang-format over the given files (checking or formatting), batching many files
+    into each invocation: one process startup per batch instead of one per file.
+
+    :return: a dict mapping each file to the same (changed, errors, formatter) tuple
+        produced by _process_file.
+    """
+    import boltons.iterutils
+
+    results: Dict[Path, Tuple[bool, Sequence[str], Optional[str]]] = {}
+    pending: List[Path] = []
+    for filename in files:
+        error_msg = _validate_cpp_contents(filename)
+        if error_msg is not None:
+            click.secho(error_msg, fg="red")
+            results[filename] = (False, [error_msg], None)
+        else:
+            pending.append(filename)
+
+    # Same command-line size rationale as the black chunking below.
+    chunk_size = 100
+    for batch in boltons.iterutils.chunked(pending, chunk_size):
+        if check:
+            args = ["clang-format", "-output-replacements-xml"]
+        else:
+            args = ["clang-format", "-i"]
+            mtimes = [os.path.getmtime(x) for x in batch]
+        args.extend(str(x) for x in batch)
+        try:
+            output = subprocess.check_output(args)
+        except (subprocess.CalledProcessError, OSError) as e:
+            msg = ": ERROR ({}: {}): ".format(type(e).__name__, e)
+            msg += 'Please check if "clang-format" is installed and accessible'
+            for filename in batch:
+                error_msg = _format_filename(filename) + msg
+                click.secho(error_msg, fg="red")
+                results[filename] = (False, [error_msg], "clang-format")
+            continue
+        if check:
+            # clang-format emits one XML document per input file, in input order.
+            sections = output.split(b"<?xml")[1:]
+            for filename, section in zip(batch, sections):
+                results[filename] = (b"<replacement " in section, [], "clang-format")
+        else:
+            for filename, mtime in zip(batch, mtimes):
+                results[filename] = (os.path.getmtime(filename) != mtime, [], "clang-format")
+    return results
 
 
 def _process_file(
@@ -215,126 +486,112 @@ def _process_file(
         - `errors` is a list with 0 or more error messages
         - `formatter` is an optional string with the formatter used (None if it does not apply)
     """
-    import isort.settings
+    import isort
+    from isort.exceptions import FileSkipComment
 
     # Initialize results variables
     changed = False
     errors = []
     formatter = None
 
-    if is_cpp(filename):
-        with io.open(filename, "rb") as f:
-            content_bytes = f.read()
-            try:
-                content = content_bytes.decode("UTF-8")
-            except UnicodeDecodeError:
-                msg = ": ERROR The file contents can not be decoded using UTF-8"
-                error_msg = click.format_filename(filename) + msg
-                click.secho(error_msg, fg="red")
-                errors.append(error_msg)
-                return changed, errors, formatter
-            # Remove all ASCII-characters, by substituting all printable ASCII-characters
-            # with NULL character. Here, ' ' is the first printable ASCII-character (code 32)
-            # and '~' is the last printable ASCII-character (code 126).
-            non_ascii = re.sub("[ -~]", "", content).strip()
-            use_bom = len(non_ascii) > 0
-            if use_bom and not content_bytes.startswith(codecs.BOM_UTF8):
-                msg = (
-                    ": ERROR Not a valid UTF-8 encoded file, since it contains"
-                    " non-ASCII characters. Ensure it has UTF-8 encoding with BOM."
-                )
-                error_msg = click.format_filename(filename) + msg
-                click.secho(error_msg, fg="red")
-                errors.append(error_msg)
-                return changed, errors, formatter
-
-    if is_cpp(filename) and should_use_clang_format(filename):
-        formatter = "clang-format"
-        if check:
-            output = subprocess.check_output(
-                'clang-format -output-replacements-xml "%s"' % filename, shell=True
-            )
-            changed = b"<replacement " in output
-        else:
-            mtime = os.path.getmtime(filename)
-
-            # checking if the terminal command is valid
-            # might throw an exception if clang-format is not recognized
-            try:
-                subprocess.check_output('clang-format -i "%s"' % filename, shell=True)
-            except subprocess.CalledProcessError as e:
-                msg = ": ERROR ({}: {}): ".format(type(e).__name__, e)
-                msg += 'Please check if "clang-format" is installed and accessible'
-                error_msg = click.format_filename(filename) + msg
-                click.secho(error_msg, fg="red")
-                errors.append(error_msg)
-                return changed, errors, formatter
-
-            changed = os.path.getmtime(filename) != mtime
+    # Classify the file once: every branch below reuses these instead of re-deriving
+    # extension/basename over and over.
+    extension = os.path.normcase(os.path.splitext(filename)[1])
+    cpp = is_cpp(filename)
 
-        return changed, errors, formatter
+    if cpp:
+        error_msg = _validate_cpp_contents(filename)
+        if error_msg is not None:
+            click.secho(error_msg, fg="red")
+            errors.append(error_msg)
+            return changed, errors, formatter
 
-    with io.open(filename, "r", encoding="UTF-8", newline="") as f:
+    # Binary read plus a single decode: cheaper than routing every read through the
+    # text layer's incremental decoder, and no newline translation is wanted anyway.
+    with io.open(filename, "rb") as f:
         try:
-            # There is an issue with isort (https://github.com/timothycrosley/isort/issues/350,
-            # even though closed it is not fixed!) that changes EOL to \n when there is a import
-            # reorder.
-            #
-            # So to be safe, it is necessary to peek first line to detect EOL BEFORE any
-            # processing happens.
-            first_line = f.readline()
-            f.seek(0)
-            original_contents = f.read()
+            original_contents = f.read().decode("UTF-8")
         except UnicodeDecodeError as e:
             msg = ": ERROR ({}: {})".format(type(e).__name__, e)
-            error_msg = click.format_filename(filename) + msg
+            error_msg = _format_filename(filename) + msg
             click.secho(error_msg, fg="red")
             errors.append(error_msg)
             return changed, errors, formatter
 
     new_contents = original_contents
 
-    eol = _peek_eol(first_line)
+    # There is an issue with isort (https://github.com/timothycrosley/isort/issues/350,
+    # even though closed it is not fixed!) that changes EOL to \n when there is a import
+    # reorder.
+    #
+    # So to be safe, it is necessary to detect the EOL BEFORE any processing happens.
+    eol = _detect_eol(original_contents)
     ends_with_eol = new_contents.endswith(eol)
-    extension = os.path.normcase(os.path.splitext(filename)[1])
 
     if extension == ".py":
-        settings_path = os.path.abspath(os.path.dirname(filename))
-        isort_config = isort.Config(settings_path=settings_path)
-        if isort_config.line_length < 80:
-            # The default isort configuration has 79 chars, so, if the passed
-            # does not have more than that, complain that .isort.cfg is not configured.
-            msg = ": ERROR .isort.cfg not available in repository (or line_length config < 80)."
-            error_msg = click.format_filename(filename) + msg
-            click.secho(error_msg, fg="red")
-            errors.append(error_msg)
+        # Files without a single import statement have nothing for isort to do, so skip
+        # the config lookup and the sorting round-trip entirely.
+        if _IMPORT_RE.search(new_contents) is not None:
+            settings_path = os.path.abspath(os.path.dirname(filename))
+            isort_config = _isort_config(settings_path)
+            if isort_config.line_length < 80:
+                # The default isort configuration has 79 chars, so, if the passed
+                # does not have more than that, complain that .isort.cfg is not configured.
+                msg = ": ERROR .isort.cfg not available in repository (or line_length config < 80)."
+                error_msg = _format_filename(filename) + msg
+                click.secho(error_msg, fg="red")
+                errors.append(error_msg)
 
-        try:
-            new_contents = isort.code(new_contents, extension, config=isort_config)
-        except FileSkipComment:
-            # The entire file was skipped by an "isort:skip_file"
-            new_contents = original_contents
+            try:
+                new_contents = isort.code(new_contents, extension, config=isort_config)
+            except FileSkipComment:
+                # The entire file was skipped by an "isort:skip_file"
+                new_contents = original_contents
 
         if new_contents and (new_contents[0] == codecs.BOM_UTF8.decode("UTF-8")):
             msg = ": ERROR python file should not have a BOM."
-            error_msg = click.format_filename(filename) + msg
+            error_msg = _format_filename(filename) + msg
             click.secho(error_msg, fg="red")
             errors.append(error_msg)
             new_contents = new_contents[1:]
 
-    elif is_cpp(filename):
+    elif cpp:
         formatter = "legacy formatter"
 
-    new_contents = fix_whitespace(new_contents.splitlines(True), eol, ends_with_eol)
-    changed = new_contents != original_contents
+    new_contents = _fix_whitespace_text(new_contents, eol, ends_with_eol)
+    # The identity check makes no-op pipelines (which hand the original string back)
+    # skip the content comparison entirely.
+    changed = new_contents is not original_contents and new_contents != original_contents
 
     if not check and changed:
-        with io.open(filename, "w", encoding="UTF-8", newline="") as f:
-            f.write(new_contents)
+        _atomic_write(filename, new_contents.encode("UTF-8"))
 
     return changed, errors, formatter
 
 
+def _atomic_write(filename: Path, data: bytes) -> None:
+    """
+    Write `data` to a sibling temporary file and rename it over `filename`, so an
+    interrupted run cannot leave a truncated file behind. Permission bits of the
+    original file are preserved.
+    """
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(filename) + ".", dir=directory)
+    try:
+        with io.open(fd, "wb") as f:
+            f.write(data)
+        shutil.copymode(filename, tmp_path)
+        os.replace(tmp_path, filename)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 def run_black_on_python_files(
     files: Sequence[Path], check: bool, exclude_patterns: Sequence[str], verbose: bool
 ) -> Tuple[bool, bool]:
@@ -364,6 +621,8 @@ def run_black_on_python_files(
         # Once black grows a public API (https://github.com/psf/black/issues/779), we can
         # ditch running things in a subprocess altogether.
         if sys.platform.startswith("win"):
+            import boltons.iterutils
+
             chunk_size = 100
             file_iterator = boltons.iterutils.chunked(py_files, chunk_size)
         else:
@@ -397,6 +656,7 @@ def get_git_ignored_files(directory: Path) -> Set[Path]:
                 "--ignored",
                 "--untracked-files=all",
                 "--porcelain=2",
+                "-z",
                 str(directory),
             ],
             encoding="UTF-8",
@@ -406,52 +666,144 @@ def get_git_ignored_files(directory: Path) -> Set[Path]:
         return set()
     else:
         result = set()
-        for line in output.splitlines():
-            if line.startswith("!"):
+        # With -z each record ends with NUL and paths are passed through verbatim (no
+        # quoting), so names with newlines or spaces parse correctly.
+        tokens = iter(output.split("\0"))
+        for token in tokens:
+            if token.startswith("2 "):
+                # Renamed/copied entries carry the origin path as an extra token.
+                next(tokens, None)
+            elif token.startswith("! "):
                 # Use os.path.abspath() because it also normalizes the path,
                 # something which Path() doesn't do for us.
-                p = Path(os.path.abspath(line[1:].strip()))
-                result.add(p)
+                result.add(Path(os.path.abspath(token[2:])))
         return result
 
 
+def _process_files(
+    files: Sequence[Path], *, check: bool, verbose: bool, jobs: int
+) -> List[Tuple[bool, Sequence[str], Optional[str]]]:
+    """
+    Process the given files (see _process_file), optionally in parallel.
+
+    Each file is an independent unit of work (read, isort, whitespace fixes, write), so
+    with jobs != 1 they are dispatched to a process pool; results are returned in the
+    same order as `files`.
+    """
+    if jobs == 1 or len(files) <= 1:
+        return [_process_file(f, check=check, verbose=verbose) for f in files]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    def size_of(f: Path) -> int:
+        try:
+            return os.stat(f).st_size
+        except OSError:
+            return 0
+
+    process_file = functools.partial(_process_file, check=check, verbose=verbose)
+    max_workers = jobs if jobs > 0 else os.cpu_count()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # Dispatch the largest files first so one big file picked up late cannot
+        # dominate the tail of the run; results are gathered back in `files` order.
+        futures = {
+            f: executor.submit(process_file, f) for f in sorted(files, key=size_of, reverse=True)
+        }
+        return [futures[f].result() for f in files]
+
+
 def _main(
-    files_or_directories: Sequence[Path], *, check: bool, stdin: bool, commit: bool, verbose: bool
+    files_or_directories: Sequence[Path],
+    *,
+    check: bool,
+    stdin: bool,
+    commit: bool,
+    git_staged: bool = False,
+    verbose: bool,
+    jobs: int = 1,
+    use_cache: bool = False,
 ) -> int:
-    files: List[Path]
+    # Walked entries stay as plain strings until the dedupe/sort below converts
+    # everything to Path exactly once; Path construction parses the path into parts
+    # and is measurable over tens of thousands of files.
+    collected: List[Union[str, Path]]
     if stdin:
-        files = [Path(x.strip()) for x in click.get_text_stream("stdin").readlines()]
+        collected = [Path(x.strip()) for x in click.get_text_stream("stdin").readlines()]
     elif commit:
-        files = list(get_files_from_git())
+        collected = list(get_files_from_git())
+    elif git_staged:
+        collected = list(get_staged_files_from_git())
     else:
-        files = []
+        collected = []
+        # Memoized per run (not globally: the ignored set can change between runs in
+        # the same process) so repeated directory arguments spawn git only once each.
+        git_ignored_cache: Dict[str, Set[Path]] = {}
         for file_or_dir in files_or_directories:
             if os.path.isdir(file_or_dir):
-                git_ignored = get_git_ignored_files(file_or_dir)
-                for root, dirs, names in os.walk(file_or_dir):
-                    for dirname in list(dirs):
-                        if dirname in SKIP_DIRS:
-                            dirs.remove(dirname)
-                    files.extend(
-                        Path(root, n)
-                        for n in names
-                        if should_format(Path(n), PATTERNS, [])
-                        and Path(root, n).absolute() not in git_ignored
-                    )
+                key = os.path.abspath(file_or_dir)
+                git_ignored = git_ignored_cache.get(key)
+                if git_ignored is None:
+                    git_ignored = git_ignored_cache[key] = get_git_ignored_files(file_or_dir)
+                # Note: no pattern filtering here on purpose; the main loop calls
+                # should_format() on each file so skipped files can be reported
+                # with their reason in verbose mode.
+                #
+                # The cwd is resolved once instead of letting Path.absolute() issue a
+                # getcwd per walked entry, and the ignored set is compared as strings
+                # normalized the same way its keys were built (os.path.abspath).
+                cwd = os.getcwd()
+                git_ignored_strs = {os.fspath(p) for p in git_ignored}
+                collected.extend(
+                    p
+                    for p in _walk_files(str(file_or_dir))
+                    if os.path.normpath(os.path.join(cwd, p)) not in git_ignored_strs
+                )
             else:
-                files.append(file_or_dir)
+                collected.append(file_or_dir)
 
-    files = sorted(Path(x) for x in files)
+    # Drop duplicates (e.g. a file passed explicitly and also discovered by walking a
+    # parent directory) so each file is read and formatted only once.
+    files = sorted({Path(x) for x in collected})
     errors = []
-    pyproject_toml = find_pyproject_toml(files)
+    # The entries here are all files, so their common ancestor equals the common
+    # ancestor of their (far fewer) unique parent directories; commonpath splits
+    # every path given to it, which adds up over tens of thousands of files.
+    pyproject_toml = find_pyproject_toml(sorted({x.parent for x in files}))
     if pyproject_toml:
         exclude_patterns = read_exclude_patterns(pyproject_toml)
     else:
         exclude_patterns = []
 
+    format_decisions: List[Tuple[Path, bool, str]] = []
+    for filename in files:
+        fmt, reason = should_format(filename, PATTERNS, exclude_patterns)
+        format_decisions.append((filename, fmt, reason))
+
+    # With --cache, files whose stat fingerprint matches the one recorded after the
+    # last clean run are trusted and skipped entirely (no read, no formatters). The
+    # fingerprint is refreshed at the end of the run, so files we just fixed are
+    # skipped on the next invocation too. Note the cache is oblivious to black/isort
+    # configuration changes; use --no-cache after touching those.
+    file_cache: Dict[str, List[int]] = {}
+    cached_clean: Set[Path] = set()
+    if use_cache:
+        file_cache = _load_file_cache(_file_cache_path())
+        for filename, fmt, _ in format_decisions:
+            if not fmt:
+                continue
+            entry = file_cache.get(os.path.abspath(filename))
+            if entry is None:
+                continue
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            if [st.st_mtime_ns, st.st_size] == entry:
+                cached_clean.add(filename)
+
     if has_black_config(pyproject_toml):
         would_be_formatted, black_failed = run_black_on_python_files(
-            files, check, exclude_patterns, verbose
+            [x for x in files if x not in cached_clean], check, exclude_patterns, verbose
         )
         if black_failed:
             errors.append("Error formatting black (see console)")
@@ -464,36 +816,73 @@ def _main(
         click.secho("  line-length = 100", fg="cyan")
         return 1
 
+    analysed_files = [filename for filename, fmt, _ in format_decisions if fmt]
+    pending_files = [f for f in analysed_files if f not in cached_clean]
+    clang_results = run_clang_format_on_files(
+        [f for f in pending_files if is_cpp(f) and should_use_clang_format(f)], check=check
+    )
+    results = _process_files(
+        [f for f in pending_files if f not in clang_results],
+        check=check,
+        verbose=verbose,
+        jobs=jobs,
+    )
+
     changed_files = []
-    analysed_files = []
-    for filename in files:
-        fmt, reason = should_format(filename, PATTERNS, exclude_patterns)
+    clean_files = []
+    # Status lines are accumulated (already styled) and emitted in batches: one write
+    # per _REPORT_FLUSH_EVERY files instead of a flushed terminal write per file.
+    report_lines: List[str] = []
+
+    def report(msg: str, color: str) -> None:
+        report_lines.append(click.style(msg, fg=color))
+        if len(report_lines) >= _REPORT_FLUSH_EVERY:
+            click.echo("\n".join(report_lines))
+            report_lines.clear()
+
+    result_iter = iter(results)
+    for filename, fmt, reason in format_decisions:
         if not fmt:
             if verbose:
-                click.secho(click.format_filename(filename) + ": " + reason, fg="white")
+                report(_format_filename(filename) + ": " + reason, "white")
             continue
 
-        analysed_files.append(filename)
-        changed, new_errors, formatter = _process_file(filename, check=check, verbose=verbose)
+        changed: bool
+        new_errors: Sequence[str]
+        formatter: Optional[str]
+        if filename in cached_clean:
+            changed, new_errors, formatter = False, (), None
+        elif filename in clang_results:
+            changed, new_errors, formatter = clang_results[filename]
+        else:
+            changed, new_errors, formatter = next(result_iter)
         errors.extend(new_errors)
         if changed:
             changed_files.append(filename)
+        if use_cache and not new_errors and not (check and changed):
+            clean_files.append(filename)
         status, color = _get_status_and_color(check, changed)
         if changed or verbose:
-            msg = click.format_filename(filename) + ": " + status
+            msg = _format_filename(filename) + ": " + status
             if formatter is not None:
                 msg += " (" + formatter + ")"
-            click.secho(msg, fg=color)
+            report(msg, color)
 
-    def banner(caption: str) -> str:
-        caption = " %s " % caption
-        fill = (100 - len(caption)) // 2
-        h = "=" * fill
-        return h + caption + h
+    if report_lines:
+        click.echo("\n".join(report_lines))
+
+    if use_cache and not black_failed and not (check and would_be_formatted):
+        for filename in clean_files:
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            file_cache[os.path.abspath(filename)] = [st.st_mtime_ns, st.st_size]
+        _save_file_cache(_file_cache_path(), file_cache)
 
     if errors:
         click.secho("")
-        click.secho(banner("ERRORS"), fg="red")
+        click.secho(_banner("ERRORS"), fg="red")
         for error_msg in errors:
             click.secho(error_msg, fg="red")
         return 1
@@ -517,21 +906,27 @@ def _main(
     return 0
 
 
+def _banner(caption: str) -> str:
+    caption = " %s " % caption
+    fill = (100 - len(caption)) // 2
+    h = "=" * fill
+    return h + caption + h
+
+
+_STATUS_AND_COLOR = {
+    (False, False): ("Skipped", "yellow"),
+    (False, True): ("Fixed", "green"),
+    (True, False): ("OK", "green"),
+    (True, True): ("Failed", "red"),
+}
+
+
 def _get_status_and_color(check: bool, changed: bool) -> Tuple[str, str]:
     """
     Return a pair (status message, color) based if we are checking a file for correct
     formatting and if the file is supposed to be changed or not.
     """
-    if check:
-        if changed:
-            return "Failed", "red"
-        else:
-            return "OK", "green"
-    else:
-        if changed:
-            return "Fixed", "green"
-        else:
-            return "Skipped", "yellow"
+    return _STATUS_AND_COLOR[check, changed]
 
 
 def fix_whitespace(lines: Sequence[str], eol: str, ends_with_eol: bool) -> str:
@@ -549,57 +944,108 @@ def fix_whitespace(lines: Sequence[str], eol: str, ends_with_eol: bool) -> str:
     :return:
         Returns the new contents.
     """
-    lines = _strip(lines)
-    lines = [i.expandtabs(4) for i in lines]
+    # Single pass over the lines: stripping and tab expansion used to be two separate
+    # list builds, doubling the intermediate allocations. Most lines contain no tab at
+    # all, so a cheap C-level scan avoids the expandtabs walk (and its allocation).
+    lines = [i.rstrip().expandtabs(4) if "\t" in i else i.rstrip() for i in lines]
     result = eol.join(lines)
     if ends_with_eol:
         result += eol
     return result
 
 
-def _strip(lines: Sequence[str]) -> Sequence[str]:
+# Line boundaries recognized by str.splitlines besides "\r\n", "\r" and "\n"; the
+# per-line fixer converts them into the file's EOL as a side effect of the join.
+_EXTRA_LINE_BOUNDARY_RE = re.compile("[\v\f\x1c\x1d\x1e\x85\u2028\u2029]")
+# Whitespace runs (except EOL characters) at the end of a line or of the file.
+_TRAILING_WHITESPACE_RE = re.compile(r"[^\S\r\n]+(?=\r|\n|\Z)")
+
+
+def _fix_whitespace_text(contents: str, eol: str, ends_with_eol: bool) -> str:
     """
-    Splits the given text, removing the original eol but returning the eol
-    so it can be written again on disk using the original eol.
+    ``fix_whitespace`` applied to full file contents.
 
-    :param unicode contents: full file text
-    :return: a triple (lines, eol, ends_with_eol), where `lines` is a list of
-        strings, `eol` the string to be used as newline and `ends_with_eol`
-        a boolean which indicates if the last line ends with a new line or not.
+    When the text already uses `eol` exclusively and contains none of the extra line
+    boundaries `splitlines` recognizes (form feeds etc.), trailing whitespace and tabs
+    can be fixed with two whole-string C-level passes instead of splitting, fixing and
+    joining a list of lines; on clean files this also hands back the original string
+    unchanged. Anything else falls back to the per-line version.
     """
-    lines = [i.rstrip() for i in lines]
-    return lines
+    if _EXTRA_LINE_BOUNDARY_RE.search(contents) is None and _uses_eol_exclusively(contents, eol):
+        text = contents.expandtabs(4) if "\t" in contents else contents
+        text = _TRAILING_WHITESPACE_RE.sub("", text)
+        if ends_with_eol and not text.endswith(eol):
+            text += eol
+        # When ends_with_eol is False a trailing `eol` can still remain here: the
+        # unterminated last line was whitespace-only and collapsed into the sub. The
+        # per-line version keeps that EOL (the join preserves it), so keep it too.
+        return text
+    return fix_whitespace(contents.splitlines(True), eol, ends_with_eol)
+
+
+def _uses_eol_exclusively(contents: str, eol: str) -> bool:
+    """Whether every line ending in `contents` is exactly `eol`."""
+    if eol == "\r\n":
+        return contents.count("\r") == contents.count("\n") == contents.count("\r\n")
+    if eol == "\r":
+        return "\n" not in contents
+    return "\r" not in contents
+
 
+_EOL_RE = re.compile("\r\n|\r|\n")
 
-def _peek_eol(line: str) -> str:
+
+def _detect_eol(contents: str) -> str:
     """
-    :param unicode line: A line in file.
+    :param unicode contents: full file text.
     :rtype: unicode
-    :return: EOL used by line.
+    :return: EOL used by the first line in `contents` ("\\n" when there is none).
     """
-    eol = "\n"
-    if line:
-        if line.endswith("\r"):
-            eol = "\r"
-        elif line.endswith("\r\n"):
-            eol = "\r\n"
-    return eol
+    match = _EOL_RE.search(contents)
+    return match.group() if match is not None else "\n"
 
 
 def get_files_from_git() -> Sequence[Path]:
     """Obtain from a list of modified files in the current repository."""
-
-    def get_files(cmd: str) -> Sequence[str]:
-        output = subprocess.check_output(cmd, shell=True)
-        return [os.fsdecode(x) for x in output.splitlines()]
-
-    root = os.fsdecode(subprocess.check_output("git rev-parse --show-toplevel", shell=True).strip())
+    root = os.fsdecode(subprocess.check_output(["git", "rev-parse", "--show-toplevel"]).strip())
+    # A single `git status` call provides the same information the previous three
+    # `git diff --staged`/`git diff`/`git ls-files -o` calls did, paying one git
+    # startup instead of three. NUL delimiters avoid git's C-style quoting of
+    # file names with spaces or non-ASCII characters.
+    output = os.fsdecode(
+        subprocess.check_output(["git", "status", "--porcelain", "-z", "--untracked-files=all"])
+    )
     result: Set[str] = set()
-    result.update(get_files("git diff --name-only --diff-filter=ACM --staged"))
-    result.update(get_files("git diff --name-only --diff-filter=ACM"))
-    result.update(get_files("git ls-files -o --full-name --exclude-standard"))
+    entries = iter(output.split("\0"))
+    for entry in entries:
+        if len(entry) < 4:
+            continue
+        index_status, worktree_status, path = entry[0], entry[1], entry[3:]
+        if index_status in "RC":
+            # rename/copy entries are followed by an extra NUL-separated origin path
+            next(entries, None)
+        untracked = index_status == "?" and worktree_status == "?"
+        if untracked or index_status in "ACM" or worktree_status in "ACM":
+            result.add(path)
     return sorted(Path(root, x) for x in result)
 
 
+def get_staged_files_from_git() -> Sequence[Path]:
+    """Obtain the list of files staged for commit in the current repository."""
+    root = os.fsdecode(subprocess.check_output(["git", "rev-parse", "--show-toplevel"]).strip())
+    try:
+        output = os.fsdecode(
+            subprocess.check_output(
+                ["git", "diff-index", "--diff-filter=ACM", "--name-only", "--cached", "-z", "HEAD"]
+            )
+        )
+    except subprocess.CalledProcessError:
+        # A repository without commits has no HEAD to diff against; treat that as an
+        # empty staged list (as the old piped hook did) instead of blocking the very
+        # first commit with a traceback.
+        return []
+    return sorted(Path(root, x) for x in output.split("\0") if x)
+
+
 if __name__ == "__main__":
     main()
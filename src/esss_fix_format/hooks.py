@@ -1,6 +1,8 @@
 import abc
+import functools
 import textwrap
-from typing import Dict
+from types import MappingProxyType
+from typing import Mapping
 
 
 class GitHook(metaclass=abc.ABCMeta):
@@ -22,6 +24,30 @@ class GitHook(metaclass=abc.ABCMeta):
         """
 
 
+# Dedented once at import time; the script body is a constant and dedent scans the
+# whole text on every call.
+_FIX_FORMAT_SCRIPT = textwrap.dedent(
+    """\
+    if ! command -v fix-format >/dev/null 2>&1
+    then
+        echo "fix-format not found, install in an active environment with:"
+        echo "  conda install esss_fix_format"
+        exit 1
+    else
+        fix-format --check --git-staged
+        returncode=$?
+        if [ "$returncode" != "0" ]
+        then
+            echo ""
+            echo "fix-format check failed (status=$returncode)! To fix, execute:"
+            echo "  ff -c"
+            exit 1
+        fi
+    fi
+    """
+)
+
+
 class FixFormatGitHook(GitHook):
     """
     A hook that prevents developer from committing unless it respects formats expected by
@@ -32,44 +58,23 @@ class FixFormatGitHook(GitHook):
         return "fix-format"
 
     def script(self) -> str:
-        script = """\
-        if ! which fix-format >/dev/null 2>&1
-        then
-            echo "fix-format not found, install in an active environment with:"
-            echo "  conda install esss_fix_format"
-            exit 1
-        else
-            git diff-index --diff-filter=ACM --name-only --cached HEAD | fix-format --check --stdin
-            returncode=$?
-            if [ "$returncode" != "0" ]
-            then
-                echo ""
-                echo "fix-format check failed (status=$returncode)! To fix, execute:"
-                echo "  ff -c"
-                exit 1
-            fi
-        fi
-        """
-        return textwrap.dedent(script)
+        return _FIX_FORMAT_SCRIPT
 
 
-def _add_hook(hook: GitHook) -> None:
-    name = hook.name()
-    if name not in _HOOKS:
-        _HOOKS[name] = hook
-    else:
-        raise KeyError(f"A hook named '{name}' already exists")
-
-
-# All hooks available by default
-_HOOKS: Dict[str, GitHook] = {}
-_add_hook(FixFormatGitHook())
+# All hooks available by default, built once at import and frozen; a read-only
+# mapping makes it explicit that hooks are not registered at runtime.
+_ALL_HOOKS = (FixFormatGitHook(),)
+_HOOKS: Mapping[str, GitHook] = MappingProxyType({hook.name(): hook for hook in _ALL_HOOKS})
 
 
+@functools.lru_cache(maxsize=None)
 def get_default_hook(name: str) -> GitHook:
     """
     :param name: Name of a hook.
     :rtype:
     :return: A Git hook object.
+
+    Cached: the registry is frozen, so repeated lookups of the same name (one per
+    installed hook part) are served from the cache.
     """
     return _HOOKS[name]